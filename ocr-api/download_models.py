@@ -3,15 +3,268 @@
 下载 PaddleOCR 模型文件到指定目录
 """
 
+import contextlib
 import os
+import re
 import sys
+import shutil
+import stat
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:
+    # Windows 不支持 fcntl，下载时不加锁
+    fcntl = None
+
+
+_COPY_BUFSIZE = 1 << 20
+
+# 距上次成功下载不超过该时长（秒）时直接复用已有模型，不再初始化 PaddleOCR
+SYNC_MARKER_TTL = 24 * 60 * 60
+# 下载锁文件，防止多个实例同时下载同一目录
+LOCK_FILE_NAME = '.download.lock'
+
+
+def _copy_file(src: str, dst: str, st: os.stat_result):
+    """复制单个文件内容，Linux 下使用 copy_file_range 在内核中完成（支持 reflink 的文件系统上几乎无 I/O）"""
+    src_fd = os.open(src, os.O_RDONLY)
+    try:
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, stat.S_IMODE(st.st_mode))
+        try:
+            if hasattr(os, 'copy_file_range'):
+                try:
+                    remaining = st.st_size
+                    while remaining > 0:
+                        n = os.copy_file_range(src_fd, dst_fd, remaining)
+                        if n == 0:
+                            break
+                        remaining -= n
+                    return
+                except OSError:
+                    # 跨文件系统（EXDEV）或文件系统不支持时回退到普通复制；
+                    # 两个文件的偏移量已随已复制部分前移，从断点继续即可
+                    pass
+            with open(src_fd, 'rb', closefd=False) as fsrc, open(dst_fd, 'wb', closefd=False) as fdst:
+                shutil.copyfileobj(fsrc, fdst, _COPY_BUFSIZE)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+
+def _fast_copytree(src: Path, dst: Path):
+    """复制目录树，每个条目只 stat 一次并复用结果设置权限和时间戳"""
+    dst.mkdir(exist_ok=True)
+    with os.scandir(src) as it:
+        for entry in it:
+            st = entry.stat(follow_symlinks=False)
+            dst_path = os.path.join(dst, entry.name)
+            if stat.S_ISDIR(st.st_mode):
+                _fast_copytree(Path(entry.path), Path(dst_path))
+            elif stat.S_ISLNK(st.st_mode):
+                os.symlink(os.readlink(entry.path), dst_path)
+                continue
+            else:
+                _copy_file(entry.path, dst_path, st)
+            os.chmod(dst_path, stat.S_IMODE(st.st_mode))
+            os.utime(dst_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def _remove(path: Path):
+    """删除文件、符号链接或目录"""
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+def _swap_into_place(tmp: Path, dest_item: Path):
+    """用已复制好的 tmp 替换 dest_item；文件覆盖文件时直接原子替换，涉及目录时先把旧条目移开"""
+    tmp_is_dir = tmp.is_dir() and not tmp.is_symlink()
+    dest_is_dir = dest_item.is_dir() and not dest_item.is_symlink()
+    if os.path.lexists(dest_item) and (tmp_is_dir or dest_is_dir):
+        # os.replace 不能用目录覆盖已有条目，也不能用文件覆盖目录
+        old = dest_item.with_name(f".{dest_item.name}.old.{os.getpid()}")
+        os.replace(dest_item, old)
+        os.replace(tmp, dest_item)
+        _remove(old)
+    else:
+        os.replace(tmp, dest_item)
+
+
+def _copy_one(item: Path, dest_item: Path):
+    """复制单个模型文件或目录：先复制到临时路径再重命名替换，中途中断不会留下损坏的目标"""
+    # 临时路径以点开头，进程被杀后残留的条目不会被当成模型
+    tmp = dest_item.with_name(f".{dest_item.name}.tmp.{os.getpid()}")
+    try:
+        if item.is_dir():
+            _fast_copytree(item, tmp)
+        else:
+            shutil.copy2(item, tmp)
+        _swap_into_place(tmp, dest_item)
+    except BaseException:
+        if os.path.lexists(tmp):
+            _remove(tmp)
+        raise
+
+
+def _parallel_copytree(entries: list, dst: Path) -> int:
+    """按顶层条目（os.DirEntry）并行复制目录内容，返回失败的条目数"""
+    # 模型由大量小文件组成，并行复制以重叠 I/O 等待
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_copy_one, Path(entry.path), dst / entry.name): entry
+            for entry in entries
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[模型下载] ⚠️  复制 {futures[future].name} 失败: {e}")
+    return failed
+
+
+def _native_copytree(src: Path, dst: Path, entries: list) -> int:
+    """优先使用系统复制工具（cp -a / robocopy）复制目录内容，不可用时回退到 Python 实现"""
+    # 先复制到目标目录内的隐藏临时目录（与目标同一文件系统），完成后逐个重命名到位，
+    # 中途中断不会在目标目录留下复制了一半的模型
+    tmp_root = dst / f".copy.tmp.{os.getpid()}"
+    if sys.platform.startswith('linux'):
+        # --reflink=auto 在 btrfs/XFS 上可以写时复制，几乎不产生实际 I/O
+        cmd = ['cp', '-a', '--reflink=auto', f'{src}/.', str(tmp_root)]
+    elif sys.platform == 'win32':
+        cmd = ['robocopy', str(src), str(tmp_root), '/E', '/MT:16', '/NFL', '/NDL', '/NJH', '/NJS']
+    else:
+        return _parallel_copytree(entries, dst)
+    
+    tmp_root.mkdir(exist_ok=True)
+    try:
+        try:
+            returncode = subprocess.run(cmd).returncode
+        except FileNotFoundError:
+            returncode = None
+        # robocopy 返回码 0/1 表示成功（无变化/有文件复制）
+        if returncode == 0 or (returncode == 1 and sys.platform == 'win32'):
+            with os.scandir(tmp_root) as it:
+                for entry in it:
+                    _swap_into_place(Path(entry.path), dst / entry.name)
+            return 0
+        if returncode is not None:
+            print(f"[模型下载] ⚠️  系统复制命令失败 (返回码 {returncode})，改用 Python 复制")
+    finally:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+    return _parallel_copytree(entries, dst)
+
+
+def _clear_staging(models_path: Path):
+    """清理被中断的复制残留的临时条目（.<name>.tmp.<pid>、.<name>.old.<pid>、.copy.tmp.<pid>）"""
+    for pattern in ('.*.tmp.*', '.*.old.*'):
+        for path in models_path.glob(pattern):
+            try:
+                _remove(path)
+            except OSError as e:
+                print(f"[模型下载] ⚠️  清理临时文件 {path.name} 失败: {e}")
+
+
+def _tree_size(path: str) -> int:
+    """统计目录下所有文件的总大小（复用 scandir 缓存的 stat 结果）"""
+    total = 0
+    stack = [path]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                st = entry.stat(follow_symlinks=False)
+                if stat.S_ISDIR(st.st_mode):
+                    stack.append(entry.path)
+                else:
+                    total += st.st_size
+    return total
+
+
+def _parse_version(version: str) -> tuple:
+    """解析版本号的主、次版本（如 '2.7.0.3' -> (2, 7)），无法解析时返回 (0, 0)"""
+    match = re.match(r'(\d+)\.(\d+)', version)
+    return (int(match.group(1)), int(match.group(2))) if match else (0, 0)
+
+
+def _scandir(path) -> list:
+    """列出目录中的非隐藏条目（os.DirEntry，忽略 .last_sync、.download.lock 等标记文件），目录不存在时返回空列表"""
+    try:
+        with os.scandir(path) as it:
+            return [entry for entry in it if not entry.name.startswith('.')]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+def _has_models(path: Path) -> bool:
+    """目录下是否至少有一个非空的模型子目录"""
+    return any(entry.is_dir() and _scandir(entry.path) for entry in _scandir(path))
+
+
+def _is_synced(marker: Path, models_path: Path) -> bool:
+    """标记文件在有效期内且目录中有模型"""
+    return marker.exists() and time.time() - marker.stat().st_mtime < SYNC_MARKER_TTL and _has_models(models_path)
+
+
+@contextlib.contextmanager
+def _download_lock(models_path: Path):
+    """在模型目录中加独占文件锁；不支持 fcntl 的平台（Windows）不加锁"""
+    if fcntl is None:
+        yield
+        return
+    lockfile = models_path / LOCK_FILE_NAME
+    lockfile.touch()
+    with open(lockfile, 'r+') as lf:
+        try:
+            fcntl.flock(lf, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print("[模型下载] 另一个进程正在下载模型，等待其完成...")
+            fcntl.flock(lf, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lf, fcntl.LOCK_UN)
+
+
 def download_models(models_dir: str = "./models"):
     """下载 PaddleOCR 模型到指定目录"""
     models_path = Path(models_dir)
     models_path.mkdir(parents=True, exist_ok=True)
     
+    # 上次成功下载的标记文件，用于跳过重复初始化 PaddleOCR
+    marker = models_path / '.last_sync'
+    if os.environ.get('OCR_DISABLE_REMOTE_MODELS') == '1':
+        # 离线模式：只使用已有模型，不联网下载
+        if _has_models(models_path):
+            print(f"[模型下载] 离线模式，使用已有模型: {models_path.absolute()}")
+            return True
+        print(f"[模型下载] ❌ 离线模式 (OCR_DISABLE_REMOTE_MODELS=1) 下未找到已有模型: {models_path.absolute()}")
+        return False
+    if _is_synced(marker, models_path):
+        print(f"[模型下载] ✅ 模型已存在且在有效期内 (cache hit)，跳过下载: {models_path.absolute()}")
+        return True
+    
+    # 同一模型目录同一时间只允许一个实例下载，其他实例等待后直接复用结果
+    with _download_lock(models_path):
+        if _is_synced(marker, models_path):
+            print(f"[模型下载] ✅ 其他进程已完成下载 (cache hit)，跳过下载: {models_path.absolute()}")
+            return True
+        # 持有锁时不会有其他进程在复制，残留的临时条目都来自被中断的进程；
+        # 不加锁的平台无法区分，只能保留（以点开头，不影响模型检测）
+        if fcntl is not None:
+            _clear_staging(models_path)
+        return _download_models(models_path, marker)
+
+
+def _download_models(models_path: Path, marker: Path) -> bool:
+    """初始化 PaddleOCR 下载模型（调用方需持有下载锁）"""
     # 获取绝对路径
     absolute_path = models_path.absolute()
     
@@ -28,26 +281,31 @@ def download_models(models_dir: str = "./models"):
     print("[模型下载] 这可能需要几分钟时间，请耐心等待...")
     
     try:
+        import paddleocr
         from paddleocr import PaddleOCR
         
         # 初始化 PaddleOCR（会自动下载模型）
         print("[模型下载] 正在下载中文模型...")
-        # PaddleOCR 3.x 版本参数
-        try:
-            # 尝试 3.x 版本参数
+        # 根据版本选择初始化参数，避免先用错误参数初始化失败再重试
+        version_str = getattr(paddleocr, '__version__', '')
+        version = _parse_version(version_str)
+        if version >= (3, 0):
+            # PaddleOCR 3.x 版本参数
             ocr = PaddleOCR(lang='ch', det_model_dir=None, rec_model_dir=None, cls_model_dir=None)
-        except Exception:
-            # 如果失败，尝试 2.6.x 版本参数
-            try:
-                ocr = PaddleOCR(
-                    use_angle_cls=True,
-                    lang='ch',
-                    use_gpu=False
-                )
-            except Exception as e:
-                # 最后尝试，不指定任何参数，让 PaddleOCR 自动处理
-                print(f"[模型下载] 警告: 使用兼容模式初始化: {e}")
-                ocr = PaddleOCR()
+        elif version >= (2, 6):
+            # PaddleOCR 2.6.x 版本参数
+            ocr = PaddleOCR(
+                use_angle_cls=True,
+                lang='ch',
+                use_gpu=False
+            )
+        else:
+            # 旧版本或未知版本，不指定任何参数，让 PaddleOCR 自动处理
+            if version == (0, 0):
+                print(f"[模型下载] 警告: 无法识别 PaddleOCR 版本 ({version_str or '未知'})，使用兼容模式初始化")
+            else:
+                print(f"[模型下载] 警告: PaddleOCR {version_str} 低于 2.6，使用兼容模式初始化")
+            ocr = PaddleOCR()
         
         print("[模型下载] ✅ 模型下载完成！")
         
@@ -55,45 +313,51 @@ def download_models(models_dir: str = "./models"):
         default_models_dir = Path("/root/.paddlex/official_models")
         home_models_dir = Path(os.path.expanduser("~/.paddlex/official_models"))
         
-        # 如果模型下载到了默认位置，复制到目标目录
+        # 如果模型下载到了默认位置，复制到目标目录（每个目录只列出一次，后续复用）
+        default_entries = _scandir(default_models_dir)
         models_to_copy = []
-        if default_models_dir.exists() and any(default_models_dir.iterdir()):
-            models_to_copy.append(("默认位置", default_models_dir))
-        if home_models_dir.exists() and home_models_dir != default_models_dir and any(home_models_dir.iterdir()):
-            models_to_copy.append(("HOME目录", home_models_dir))
+        if default_entries:
+            models_to_copy.append(("默认位置", default_models_dir, default_entries))
+        if home_models_dir != default_models_dir:
+            home_entries = _scandir(home_models_dir)
+            if home_entries:
+                models_to_copy.append(("HOME目录", home_models_dir, home_entries))
         
-        if models_to_copy and not any(models_path.iterdir()):
+        copy_failed = False
+        if models_to_copy and not _scandir(models_path):
             print(f"\n[模型下载] ⚠️  检测到模型下载到了其他位置，正在复制到目标目录...")
-            for location_name, source_dir in models_to_copy:
+            for location_name, source_dir, src_entries in models_to_copy:
                 try:
-                    import shutil
-                    if source_dir.exists():
+                    if src_entries:
                         print(f"[模型下载] 从 {location_name} ({source_dir}) 复制模型...")
-                        for item in source_dir.iterdir():
-                            dest_item = models_path / item.name
-                            if dest_item.exists():
-                                if dest_item.is_dir():
-                                    shutil.rmtree(dest_item)
-                                else:
-                                    dest_item.unlink()
-                            if item.is_dir():
-                                shutil.copytree(item, dest_item)
-                            else:
-                                shutil.copy2(item, dest_item)
-                        print(f"[模型下载] ✅ 模型已从 {location_name} 复制到 {absolute_path}")
+                        failed = _native_copytree(source_dir, models_path, src_entries)
+                        if failed:
+                            copy_failed = True
+                            print(f"[模型下载] ⚠️  {failed} 个条目复制失败")
+                        else:
+                            # 前一个位置出错时，以本次完整复制的结果为准
+                            copy_failed = False
+                            print(f"[模型下载] ✅ 模型已从 {location_name} 复制到 {absolute_path}")
                         break  # 只复制第一个找到的位置
                 except Exception as e:
+                    copy_failed = True
                     print(f"[模型下载] ⚠️  从 {location_name} 复制模型时出错: {e}")
+            if copy_failed:
+                # 只在目标目录为空时才会复制，目录中的条目都是本次复制的；
+                # 删除不完整的结果，下次运行时目录为空会重新复制
+                print("[模型下载] 正在清理未完整复制的模型...")
+                for entry in _scandir(models_path):
+                    _remove(Path(entry.path))
         
         print(f"[模型下载] 模型文件位置: {absolute_path}")
         
         # 列出下载的模型
-        model_dirs = list(models_path.glob("*"))
+        model_dirs = _scandir(models_path)
         if model_dirs:
             print("\n[模型下载] 已下载的模型:")
             for model_dir in model_dirs:
                 if model_dir.is_dir():
-                    size = sum(f.stat().st_size for f in model_dir.rglob('*') if f.is_file())
+                    size = _tree_size(model_dir.path)
                     size_mb = size / (1024 * 1024)
                     print(f"  - {model_dir.name} ({size_mb:.2f} MB)")
                 elif model_dir.is_file():
@@ -101,15 +365,25 @@ def download_models(models_dir: str = "./models"):
                     print(f"  - {model_dir.name} ({size_mb:.2f} MB)")
         else:
             print("\n[模型下载] ⚠️  警告: 目标模型目录为空")
-            if default_models_dir.exists() and any(default_models_dir.iterdir()):
+            if default_entries:
                 print(f"[模型下载] 模型可能位于: {default_models_dir}")
                 print(f"[模型下载] 将在容器启动时自动复制到挂载目录")
         
+        if copy_failed:
+            # 部分模型缺失，不写入标记，下次运行时重新复制
+            print(f"[模型下载] ❌ 模型未能完整复制到 {absolute_path}")
+            return False
+        
+        if _has_models(models_path):
+            marker.write_text(str(time.time()))
+        
         return True
     except Exception as e:
-        print(f"[模型下载] ❌ 模型下载失败: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"[模型下载] ❌ 模型下载失败: {type(e).__name__}: {e}")
+        # 设置 OCR_DEBUG 时才输出完整堆栈
+        if os.environ.get('OCR_DEBUG'):
+            import traceback
+            traceback.print_exc()
         return False
 
 if __name__ == "__main__":
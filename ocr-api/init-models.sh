@@ -26,7 +26,8 @@ export OCR_MODELS_DIR="$MODELS_TARGET"
 export DISABLE_MODEL_SOURCE_CHECK="True"
 
 # 检查目标目录是否已有模型文件
-if [ "$(ls -A $MODELS_TARGET 2>/dev/null)" ]; then
+# 忽略 .download.lock、.last_sync 等隐藏标记文件（ls 不带 -A）
+if [ "$(ls $MODELS_TARGET 2>/dev/null)" ]; then
     echo "✅ 模型目录已有文件，跳过下载"
     echo ""
     echo "已存在的模型:"
@@ -47,7 +48,7 @@ if [ -d "$MODELS_SOURCE" ] && [ "$(ls -A $MODELS_SOURCE 2>/dev/null)" ]; then
     # 复制模型文件到目标目录
     cp -r "$MODELS_SOURCE"/* "$MODELS_TARGET"/ 2>/dev/null || true
     
-    if [ "$(ls -A $MODELS_TARGET 2>/dev/null)" ]; then
+    if [ "$(ls $MODELS_TARGET 2>/dev/null)" ]; then
         echo "✅ 模型文件已复制到目标目录"
         echo ""
         echo "已复制的模型:"
@@ -88,7 +89,7 @@ if python3 download_models.py "$MODELS_TARGET"; then
     
     # 再次检查，如果模型下载到了默认位置，复制到目标目录
     if [ -d "$MODELS_SOURCE" ] && [ "$(ls -A $MODELS_SOURCE 2>/dev/null)" ]; then
-        if [ ! "$(ls -A $MODELS_TARGET 2>/dev/null)" ]; then
+        if [ ! "$(ls $MODELS_TARGET 2>/dev/null)" ]; then
             echo "⚠️  模型下载到了默认位置，正在复制到目标目录..."
             cp -r "$MODELS_SOURCE"/* "$MODELS_TARGET"/ 2>/dev/null || true
         fi
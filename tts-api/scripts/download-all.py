@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+TTS 模型并行下载脚本
+
+同时运行 IndexTTS2、CosyVoice、MultiTTS 的下载脚本，克隆等网络下载阶段并行进行；
+各脚本的 pip 安装通过公共目录中的文件锁依次执行，避免同时写入同一个 site-packages。
+Windows 不支持该文件锁，改为依次运行各脚本。
+"""
+import sys
+import os
+import asyncio
+from pathlib import Path
+
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+# (日志前缀, 脚本文件名, 模型子目录)
+DOWNLOADS = [
+    ('IndexTTS2', 'download-indextts2.py', 'indextts2'),
+    ('CosyVoice', 'download-cosyvoice.py', 'cosyvoice'),
+    ('MultiTTS', 'download-multitts.py', 'multitts'),
+]
+
+
+async def run(name, script, models_dir):
+    """运行单个下载脚本，逐行输出带前缀的日志，返回退出码"""
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, '-u', str(SCRIPTS_DIR / script), str(models_dir),
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    prefix = f"[{name}] "
+    async for line in proc.stdout:
+        sys.stdout.write(prefix + line.decode(errors='replace'))
+        sys.stdout.flush()
+    return await proc.wait()
+
+
+async def download_all(models_dir):
+    if sys.platform == 'win32':
+        # Windows 没有 fcntl，各脚本的 pip 安装锁不生效，依次运行以免同时写入 site-packages
+        return [await run(name, script, models_dir / subdir) for name, script, subdir in DOWNLOADS]
+    return await asyncio.gather(*[
+        run(name, script, models_dir / subdir)
+        for name, script, subdir in DOWNLOADS
+    ])
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python download-all.py <models_dir>")
+        sys.exit(1)
+
+    models_dir = Path(sys.argv[1])
+
+    # 所有子脚本共用同一份 wheel 缓存
+    os.environ.setdefault('PIP_CACHE_DIR', str(models_dir / '.pip-cache'))
+    os.environ.setdefault('UV_CACHE_DIR', str(models_dir / '.uv-cache'))
+
+    mode = "依次" if sys.platform == 'win32' else "并行"
+    print(f"[下载] {mode}安装 TTS 模型到: {models_dir}")
+    results = asyncio.run(download_all(models_dir))
+
+    print("")
+    failed = False
+    for (name, _, _), code in zip(DOWNLOADS, results):
+        if code == 0:
+            print(f"✅ {name} 安装成功")
+        else:
+            failed = True
+            print(f"❌ {name} 安装失败（退出码 {code}）")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
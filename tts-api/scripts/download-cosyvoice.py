@@ -4,9 +4,85 @@ CosyVoice 模型下载脚本
 """
 import sys
 import os
+import collections
+import shutil
 import subprocess
 from pathlib import Path
 
+from install_utils import (
+    PIP_INSTALL, acquire_download_lock, editable_install_cmd, pip_install_lock, setup_pip_cache,
+)
+
+# 设置 DEBUG 环境变量时实时输出安装日志
+DEBUG = bool(os.environ.get('DEBUG'))
+
+
+def _run_streamed(cmd, tail_lines=200):
+    """逐行读取子进程输出，只保留最后若干行用于报错，避免整体缓存在内存中"""
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+    tail = collections.deque(maxlen=tail_lines)
+    for line in proc.stdout:
+        tail.append(line)
+        if DEBUG:
+            sys.stdout.write(line)
+    returncode = proc.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd, output=''.join(tail))
+
+
+def _xcode_developer_dir():
+    """返回 xcode-select -p 的路径（如 /Applications/Xcode.app/Contents/Developer），获取失败时返回空字符串"""
+    try:
+        return subprocess.run(['xcode-select', '-p'], capture_output=True, text=True).stdout.strip()
+    except FileNotFoundError:
+        return ''
+
+
+InstallTarget = collections.namedtuple('InstallTarget', ['path', 'cmd', 'cwd', 'label', 'method'])
+
+
+def _install_target(path, is_root):
+    """检查目录中的 setup.py / pyproject.toml，返回对应的安装命令"""
+    has_setup_py = os.path.isfile(os.path.join(path, 'setup.py'))
+    if is_root:
+        if has_setup_py:
+            return InstallTarget(path, [sys.executable, 'setup.py', 'install'], str(path),
+                                 "找到 setup.py，使用 setup.py 安装", "方法2: setup.py")
+        if os.path.isfile(os.path.join(path, 'pyproject.toml')):
+            return InstallTarget(path, editable_install_cmd(path), None,
+                                 "找到 pyproject.toml，使用 pip 安装", "方法2: pyproject.toml")
+        return None
+    name = os.path.basename(path)
+    if has_setup_py or os.path.isfile(os.path.join(path, 'pyproject.toml')):
+        found = 'setup.py' if has_setup_py else 'pyproject.toml'
+        return InstallTarget(path, editable_install_cmd(path), None,
+                             f"在 {name} 中找到 {found}", f"方法3: {name}")
+    return None
+
+
+def _find_install_root(root):
+    """在仓库根目录及一级子目录中查找可安装的 Python 包，返回第一个命中的安装目标"""
+    target = _install_target(root, is_root=True)
+    if target:
+        return target
+    print("[CosyVoice] 尝试方法3: 查找子目录...")
+    with os.scandir(root) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                target = _install_target(entry.path, is_root=False)
+                if target:
+                    return target
+    return None
+
+
+def _cosyvoice_installed():
+    """cosyvoice 是否可导入（在新的解释器中检查，以识别刚安装的包）"""
+    result = subprocess.run([
+        sys.executable, '-c',
+        "import importlib.util, sys; sys.exit(importlib.util.find_spec('cosyvoice') is None)"
+    ], capture_output=True)
+    return result.returncode == 0
+
 
 def main():
     if len(sys.argv) < 2:
@@ -16,12 +92,18 @@ def main():
     models_dir = Path(sys.argv[1])
     cosyvoice_source_dir = models_dir / 'cosyvoice-source'
     
+    setup_pip_cache(models_dir)
+    
+    # 同一模型目录同一时间只允许一个实例安装
+    lock_file, waited = acquire_download_lock(models_dir, '[CosyVoice]')
+    if waited and _cosyvoice_installed():
+        print("✅ CosyVoice 已由另一个进程安装完成")
+        return
+    
     print(f"[CosyVoice] 开始安装...")
     
     # 检查 Git 是否可用
-    try:
-        subprocess.run(['git', '--version'], check=True, capture_output=True)
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    if shutil.which('git') is None:
         print("ERROR: Git 未安装或不可用")
         print("")
         print("macOS 安装 Git:")
@@ -31,7 +113,8 @@ def main():
         sys.exit(1)
     
     # 检查 Xcode license（macOS）
-    if sys.platform == 'darwin':
+    # 只装了 Command Line Tools 时无需同意 license，跳过较慢的 xcodebuild 检查
+    if sys.platform == 'darwin' and not _xcode_developer_dir().endswith('CommandLineTools'):
         try:
             result = subprocess.run(['xcodebuild', '-license', 'check'], capture_output=True, text=True)
             if result.returncode != 0:
@@ -60,13 +143,18 @@ def main():
     # 方法1: 尝试使用 pip 直接安装（如果包存在）
     print("[CosyVoice] 尝试方法1: 使用 pip 安装...")
     try:
-        subprocess.run([
-            sys.executable, '-m', 'pip', 'install',
-            'git+https://github.com/FunAudioLLM/CosyVoice.git'
-        ], check=True, capture_output=True)
+        with pip_install_lock(models_dir, '[CosyVoice]'):
+            _run_streamed([
+                *PIP_INSTALL,
+                'git+https://github.com/FunAudioLLM/CosyVoice.git'
+            ])
         print("✅ CosyVoice 安装成功（方法1）")
         return
-    except subprocess.CalledProcessError:
+    except subprocess.CalledProcessError as e:
+        if e.output and not DEBUG:
+            # 未开启 DEBUG 时日志没有实时输出，这里补充输出最后的日志便于排查
+            print("[CosyVoice] 方法1 安装日志（末尾部分）:")
+            sys.stdout.write(e.output)
         print("⚠️  方法1 失败，尝试方法2...")
     
     # 方法2: 手动克隆并安装
@@ -78,7 +166,6 @@ def main():
     # 如果已存在，先删除
     if cosyvoice_source_dir.exists():
         print(f"[CosyVoice] 清理已存在的目录: {cosyvoice_source_dir}")
-        import shutil
         shutil.rmtree(cosyvoice_source_dir)
     
     # 克隆仓库
@@ -98,58 +185,17 @@ def main():
         print("3. Xcode license 未同意（macOS）")
         sys.exit(1)
     
-    # 查找 setup.py 或 pyproject.toml
-    setup_py = cosyvoice_source_dir / 'setup.py'
-    pyproject_toml = cosyvoice_source_dir / 'pyproject.toml'
-    
-    if setup_py.exists():
-        print(f"[CosyVoice] 找到 setup.py，使用 setup.py 安装...")
-        try:
-            subprocess.run([
-                sys.executable, 'setup.py', 'install'
-            ], cwd=str(cosyvoice_source_dir), check=True)
-            print("✅ CosyVoice 安装成功（方法2: setup.py）")
-            return
-        except subprocess.CalledProcessError as e:
-            print(f"ERROR: setup.py 安装失败: {e}")
-    elif pyproject_toml.exists():
-        print(f"[CosyVoice] 找到 pyproject.toml，使用 pip 安装...")
+    # 查找 setup.py 或 pyproject.toml（先查仓库根目录，再查一级子目录）
+    target = _find_install_root(cosyvoice_source_dir)
+    if target:
+        print(f"[CosyVoice] {target.label}...")
         try:
-            subprocess.run([
-                sys.executable, '-m', 'pip', 'install', '-e', str(cosyvoice_source_dir)
-            ], check=True)
-            print("✅ CosyVoice 安装成功（方法2: pyproject.toml）")
+            with pip_install_lock(models_dir, '[CosyVoice]'):
+                subprocess.run(target.cmd, cwd=target.cwd, check=True)
+            print(f"✅ CosyVoice 安装成功（{target.method}）")
             return
         except subprocess.CalledProcessError as e:
-            print(f"ERROR: pyproject.toml 安装失败: {e}")
-    else:
-        # 方法3: 尝试查找子目录中的安装文件
-        print("[CosyVoice] 尝试方法3: 查找子目录...")
-        for subdir in cosyvoice_source_dir.iterdir():
-            if subdir.is_dir():
-                sub_setup_py = subdir / 'setup.py'
-                sub_pyproject_toml = subdir / 'pyproject.toml'
-                
-                if sub_setup_py.exists():
-                    print(f"[CosyVoice] 在 {subdir.name} 中找到 setup.py...")
-                    try:
-                        subprocess.run([
-                            sys.executable, '-m', 'pip', 'install', '-e', str(subdir)
-                        ], check=True)
-                        print(f"✅ CosyVoice 安装成功（方法3: {subdir.name}）")
-                        return
-                    except subprocess.CalledProcessError:
-                        continue
-                elif sub_pyproject_toml.exists():
-                    print(f"[CosyVoice] 在 {subdir.name} 中找到 pyproject.toml...")
-                    try:
-                        subprocess.run([
-                            sys.executable, '-m', 'pip', 'install', '-e', str(subdir)
-                        ], check=True)
-                        print(f"✅ CosyVoice 安装成功（方法3: {subdir.name}）")
-                        return
-                    except subprocess.CalledProcessError:
-                        continue
+            print(f"ERROR: 安装失败: {e}")
     
     # 如果所有方法都失败
     print("ERROR: CosyVoice 安装失败")
@@ -4,9 +4,28 @@ IndexTTS2 模型下载脚本
 """
 import sys
 import os
+import shutil
 import subprocess
 from pathlib import Path
 
+from install_utils import acquire_download_lock, editable_install_cmd, pip_install_lock, setup_pip_cache
+
+# 仅对本次 git 命令生效（-c），不修改全局配置：
+# 使用 HTTP/2 复用连接，并提高 LFS 并发传输数
+_GIT_HTTP_CONFIG = ['-c', 'http.version=HTTP/2', '-c', 'lfs.concurrenttransfers=16']
+
+# 安装成功后写入仓库目录的标记文件，等待锁的其他实例据此跳过重复安装
+INSTALLED_MARKER = '.installed'
+
+
+def _git_lfs_version():
+    """git-lfs 不在 PATH 中时 git 还会在 git --exec-path 下查找，通过 git lfs version 确认，不可用时返回 None"""
+    try:
+        result = subprocess.run(['git', 'lfs', 'version'], capture_output=True, text=True)
+    except FileNotFoundError:
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
 
 def main():
     if len(sys.argv) < 2:
@@ -16,13 +35,25 @@ def main():
     models_dir = Path(sys.argv[1])
     indextts2_dir = models_dir / 'index-tts'
     
+    setup_pip_cache(models_dir)
+    
+    # 同一模型目录同一时间只允许一个实例安装
+    lock_file, waited = acquire_download_lock(models_dir, '[IndexTTS2]')
+    installed_marker = indextts2_dir / INSTALLED_MARKER
+    if waited and installed_marker.exists() and (indextts2_dir / 'indextts' / 'infer_v2.py').exists():
+        print(f"[IndexTTS2] 已由另一个进程安装完成: {indextts2_dir}")
+        return
+    # 本次安装完成前清除旧标记，失败时等待的进程不会误以为已安装
+    if installed_marker.exists():
+        installed_marker.unlink()
+    
     print(f"[IndexTTS2] 开始下载到: {indextts2_dir}")
     
     # 检查 Git LFS
-    try:
-        result = subprocess.run(['git', 'lfs', 'version'], check=True, capture_output=True, text=True)
-        print(f"[IndexTTS2] Git LFS 已安装: {result.stdout.strip()}")
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    git_lfs = shutil.which('git-lfs') or _git_lfs_version()
+    if git_lfs is not None:
+        print(f"[IndexTTS2] Git LFS 已安装: {git_lfs}")
+    else:
         print("ERROR: Git LFS 未安装")
         print("")
         print("安装 Git LFS:")
@@ -38,13 +69,27 @@ def main():
     # 克隆仓库
     if not indextts2_dir.exists():
         print(f"[IndexTTS2] 克隆仓库...")
-        subprocess.run(['git', 'clone', 'https://github.com/index-tts/index-tts.git', str(indextts2_dir)], check=True)
+        # 浅克隆 + 部分克隆，只拉取当前版本；跳过 LFS 自动下载，稍后按需拉取权重
+        env = {**os.environ, 'GIT_LFS_SKIP_SMUDGE': '1'}
+        subprocess.run([
+            'git', *_GIT_HTTP_CONFIG, 'clone', '--depth', '1', '--filter=blob:none', '--single-branch',
+            'https://github.com/index-tts/index-tts.git', str(indextts2_dir)
+        ], check=True, env=env)
     else:
         print(f"[IndexTTS2] 仓库已存在: {indextts2_dir}")
     
+    # 每次都拉取权重：上次拉取中断时在这里补齐，已下载的文件不会重复下载
+    print(f"[IndexTTS2] 拉取模型权重 (Git LFS)...")
+    subprocess.run([
+        'git', *_GIT_HTTP_CONFIG, '-C', str(indextts2_dir), 'lfs', 'pull',
+        '--include=*.safetensors,*.bin', '--exclude='
+    ], check=True)
+    
     # 安装依赖
     print(f"[IndexTTS2] 安装依赖...")
-    subprocess.run([sys.executable, '-m', 'pip', 'install', '-e', str(indextts2_dir)], check=True)
+    with pip_install_lock(models_dir, '[IndexTTS2]'):
+        subprocess.run(editable_install_cmd(indextts2_dir), check=True)
+    installed_marker.touch()
     
     print(f"[IndexTTS2] 下载完成")
 
@@ -5,6 +5,8 @@ MultiTTS 模型下载脚本
 import sys
 import subprocess
 
+from install_utils import PIP_INSTALL, pip_install_lock, setup_pip_cache
+
 
 def main():
     if len(sys.argv) < 2:
@@ -13,13 +15,16 @@ def main():
     
     models_dir = sys.argv[1]
     
+    setup_pip_cache(models_dir)
+    
     print(f"[MultiTTS] 开始安装...")
     
     # 尝试安装 MultiTTS
     try:
-        subprocess.run([
-            sys.executable, '-m', 'pip', 'install', 'multi-tts'
-        ], check=True, capture_output=True)
+        with pip_install_lock(models_dir, '[MultiTTS]'):
+            subprocess.run([
+                *PIP_INSTALL, 'multi-tts'
+            ], check=True, capture_output=True)
         print(f"[MultiTTS] 安装完成（模型会在首次使用时自动下载）")
     except subprocess.CalledProcessError:
         print("WARNING: multi-tts 包在 PyPI 上不存在")
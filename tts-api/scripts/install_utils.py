@@ -0,0 +1,123 @@
+"""
+TTS 模型安装脚本共用的工具函数
+
+各 download-*.py 脚本以 python3 scripts/download-xxx.py 方式运行，脚本所在目录位于 sys.path 中，可直接 import。
+"""
+import sys
+import os
+import contextlib
+import shutil
+import importlib.metadata
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 不支持 fcntl，不加锁（download-all.py 在 Windows 上改为依次运行各脚本）
+    fcntl = None
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+try:
+    from packaging.requirements import Requirement
+except ImportError:
+    Requirement = None
+
+# 安装了 uv 时使用 uv 安装依赖（解析和安装速度远快于 pip，可通过 pip install uv 获得）
+UV = shutil.which('uv')
+PIP = [UV, 'pip'] if UV else [sys.executable, '-m', 'pip']
+# uv 默认只安装到虚拟环境，显式指定当前解释器；pip 优先使用已编译的 wheel
+PIP_INSTALL = [*PIP, 'install', '--python', sys.executable] if UV else [*PIP, 'install', '--prefer-binary']
+
+
+def setup_pip_cache(models_dir):
+    """各模型共用上级目录中的 wheel 缓存（调用方传入的是 <MODELS_DIR>/<模型名>）"""
+    cache_root = Path(models_dir).parent
+    os.environ.setdefault('PIP_CACHE_DIR', str(cache_root / '.pip-cache'))
+    os.environ.setdefault('UV_CACHE_DIR', str(cache_root / '.uv-cache'))
+    os.environ.setdefault('PIP_DISABLE_PIP_VERSION_CHECK', '1')
+
+
+def build_requires_installed(path):
+    """项目声明的构建依赖（pyproject.toml 的 [build-system].requires）是否都已安装；无法判断时返回 False"""
+    if Requirement is None:
+        # 没有 packaging 时无法比较版本约束，保持构建隔离
+        return False
+    pyproject = Path(path) / 'pyproject.toml'
+    requires = None
+    if pyproject.is_file():
+        if tomllib is None:
+            return False
+        try:
+            with open(pyproject, 'rb') as f:
+                requires = tomllib.load(f).get('build-system', {}).get('requires')
+        except (OSError, tomllib.TOMLDecodeError):
+            return False
+    if requires is None:
+        # 未声明时 pip 使用默认的 setuptools 构建后端
+        requires = ['setuptools>=40.8.0', 'wheel']
+    for spec in requires:
+        try:
+            req = Requirement(spec)
+        except ValueError:
+            return False
+        if req.marker and not req.marker.evaluate():
+            continue
+        try:
+            version = importlib.metadata.version(req.name)
+        except importlib.metadata.PackageNotFoundError:
+            return False
+        if not req.specifier.contains(version, prereleases=True):
+            return False
+    return True
+
+
+def editable_install_cmd(path):
+    """pip install -e 命令；项目的构建依赖都已安装时关闭构建隔离，避免每次重新下载构建后端"""
+    cmd = [*PIP_INSTALL]
+    if build_requires_installed(path):
+        cmd.append('--no-build-isolation')
+    return [*cmd, '-e', str(path)]
+
+
+@contextlib.contextmanager
+def pip_install_lock(models_dir, prefix):
+    """串行执行 pip 安装：download-all.py 并行运行多个安装脚本时，避免同时写入同一个 site-packages"""
+    if fcntl is None:
+        yield
+        return
+    # 锁文件放在各模型目录的公共上级目录中，所有安装脚本共用
+    lock_path = Path(models_dir).parent / '.pip-install.lock'
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'a+') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print(f"{prefix} 等待其他安装任务完成 pip 安装...")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def acquire_download_lock(models_dir, prefix):
+    """在模型目录中加独占文件锁（进程退出时自动释放），返回 (锁文件, 是否等待过其他进程)"""
+    if fcntl is None:
+        return None, False
+    models_dir = Path(models_dir)
+    models_dir.mkdir(parents=True, exist_ok=True)
+    lock_file = open(models_dir / '.download.lock', 'a+')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print(f"{prefix} 另一个进程正在安装，等待其完成...")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file, True
+    return lock_file, False